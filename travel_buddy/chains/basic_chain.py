@@ -1,25 +1,28 @@
-from langchain.chains import LLMChain
+from functools import lru_cache
+
 from langchain.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
 from langchain_huggingface.llms import HuggingFacePipeline
 
 from ..models.hf_loader import load_local_hf_pipeline
 
 
-def build_basic_chain() -> LLMChain:
-    pipe = load_local_hf_pipeline()
-    llm = HuggingFacePipeline(pipeline=pipe)
-
-    template = """
+PROMPT_TEMPLATE = """
 You are a helpful travel assistant.
 User: {question}
 Assistant:
 """.strip()
 
-    prompt = PromptTemplate(template=template, input_variables=["question"]) 
-    chain = LLMChain(llm=llm, prompt=prompt)
-    return chain
+
+@lru_cache(maxsize=1)
+def build_basic_chain() -> Runnable:
+    pipe = load_local_hf_pipeline()
+    llm = HuggingFacePipeline(pipeline=pipe)
+
+    prompt = PromptTemplate(template=PROMPT_TEMPLATE, input_variables=["question"]) 
+    return prompt | llm
 
 
 def run_basic_chain(question: str) -> str:
     chain = build_basic_chain()
-    return chain.run(question)
+    return chain.invoke({"question": question})
@@ -1,7 +1,5 @@
 import argparse
 
-from travel_buddy.graphs.basic_graph import run_graph
-
 
 def main():
     parser = argparse.ArgumentParser(description="Travel Buddy LLM CLI")
@@ -10,6 +8,8 @@ def main():
 
     prompt = " ".join(args.prompt)
 
+    # Deferred so `--help` and argument errors don't pay for importing torch/langchain.
+    from travel_buddy.graphs.basic_graph import run_graph
 
     state = run_graph(prompt)
     print(state.get("answer", ""))
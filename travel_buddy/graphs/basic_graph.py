@@ -1,18 +1,24 @@
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, TypedDict
 
 from langgraph.graph import StateGraph, START, END
 
 from ..chains.basic_chain import run_basic_chain
 
 
-def call_llm(state: Dict) -> Dict:
-    question = state.get("question", "")
-    answer = run_basic_chain(question)
-    return {"question": question, "answer": answer}
+class GraphState(TypedDict, total=False):
+    question: str
+    answer: str
 
 
+def call_llm(state: GraphState) -> Dict:
+    answer = run_basic_chain(state.get("question", ""))
+    return {"answer": answer}
+
+
+@lru_cache(maxsize=1)
 def build_graph():
-    graph = StateGraph(dict)
+    graph = StateGraph(GraphState)
     graph.add_node("llm", call_llm)
     graph.add_edge(START, "llm")
     graph.add_edge("llm", END)
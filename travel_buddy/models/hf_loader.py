@@ -1,60 +1,140 @@
 from __future__ import annotations
 
-from typing import Optional
+import warnings
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
 
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline, TextGenerationPipeline
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, PreTrainedModel, PreTrainedTokenizerBase, pipeline, TextGenerationPipeline
 
 from travel_buddy.settings import settings
 
 
+DTYPES = {
+    "float16": torch.float16,
+    "fp16": torch.float16,
+    "bfloat16": torch.bfloat16,
+    "bf16": torch.bfloat16,
+    "float32": torch.float32,
+    "fp32": torch.float32,
+}
+
+
 def get_dtype(dtype_name: Optional[str]) -> Optional[torch.dtype]:
     if not dtype_name:
         return None
-    name = dtype_name.lower()
-    mapping = {
-        "float16": torch.float16,
-        "bfloat16": torch.bfloat16,
-        "float32": torch.float32,
-    }
-    return mapping.get(name)
+    if dtype_name not in DTYPES:
+        raise ValueError(f"Unsupported HF_DTYPE value: {dtype_name!r} (expected one of {', '.join(DTYPES)})")
+    return DTYPES[dtype_name]
 
 
-def load_local_hf_pipeline(model_id: Optional[str] = None, max_new_tokens: Optional[int] = None, temperature: Optional[float] = None, top_k: Optional[float] = None, top_p: Optional[float] = None) -> TextGenerationPipeline:
-    model_id = model_id or settings.hf_model_id
+class GenerationParams(NamedTuple):
+    max_new_tokens: int
+    temperature: float
+    top_p: float
+    top_k: int
 
-    device = 0 if settings.hf_device.lower() in {"cuda", "gpu"} and torch.cuda.is_available() else -1
 
-    tokenizer = AutoTokenizer.from_pretrained(model_id)
+def resolve_generation_params(max_new_tokens: Optional[int] = None, temperature: Optional[float] = None, top_k: Optional[int] = None, top_p: Optional[float] = None) -> GenerationParams:
+    return GenerationParams(
+        max_new_tokens=max_new_tokens or settings.max_new_tokens,
+        temperature=temperature if temperature is not None else settings.temperature,
+        top_p=top_p if top_p is not None else settings.top_p,
+        top_k=top_k if top_k is not None else settings.top_k,
+    )
+
+
+def get_quantization_config(quant_name: Optional[str], compute_dtype: Optional[torch.dtype] = None) -> Optional[BitsAndBytesConfig]:
+    if not quant_name or quant_name == "none":
+        return None
+    if quant_name == "int8":
+        return BitsAndBytesConfig(load_in_8bit=True)
+    if quant_name in {"nf4", "fp4"}:
+        return BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type=quant_name,
+            bnb_4bit_compute_dtype=compute_dtype or (torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16),
+        )
+    raise ValueError(f"Unsupported HF_QUANT value: {quant_name!r} (expected none, int8, nf4 or fp4)")
+
+
+@lru_cache(maxsize=4)
+def load_model(model_id: str, device: int, dtype_name: Optional[str] = None, quant_name: Optional[str] = None) -> Tuple[PreTrainedTokenizerBase, PreTrainedModel]:
+    dtype = get_dtype(dtype_name)
+    quantization_config = get_quantization_config(quant_name, dtype)
+
+    # left padding keeps every prompt flush against its generated tokens when batching
+    tokenizer = AutoTokenizer.from_pretrained(model_id, use_fast=True, padding_side="left")
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
     model = AutoModelForCausalLM.from_pretrained(
         model_id,
-        device_map="auto" if device == 0 else None,
+        # bitsandbytes weights must be placed by accelerate
+        device_map="auto" if device == 0 or quantization_config is not None else None,
+        # on GPU "auto" keeps the checkpoint's fp16/bf16 weights; CPUs stay on fp32, where half-precision matmuls are slow
+        torch_dtype=dtype or ("auto" if device == 0 or quantization_config is not None else torch.float32),
+        low_cpu_mem_usage=True,
+        quantization_config=quantization_config,
     )
+    if settings.hf_compile:
+        if getattr(model, "_supports_static_cache", False):
+            # a static KV cache keeps decode shapes fixed so the compiled forward isn't recompiled every step
+            model.generation_config.cache_implementation = "static"
+            # compile forward only: the pipeline needs the PreTrainedModel wrapper, not an OptimizedModule;
+            # reduce-overhead relies on CUDA graphs, so CPU models use the default mode
+            mode = "reduce-overhead" if model.device.type == "cuda" else None
+            model.forward = torch.compile(model.forward, mode=mode, fullgraph=False)
+        else:
+            warnings.warn(
+                f"HF_COMPILE ignored: {model_id} does not support a static KV cache, "
+                "and compiling with a dynamic cache recompiles on every decode step"
+            )
+    return tokenizer, model
+
+
+def load_local_hf_pipeline(model_id: Optional[str] = None, max_new_tokens: Optional[int] = None, temperature: Optional[float] = None, top_k: Optional[int] = None, top_p: Optional[float] = None) -> TextGenerationPipeline:
+    model_id = model_id or settings.hf_model_id
+
+    device = 0 if settings.hf_device in {"cuda", "gpu"} and torch.cuda.is_available() else -1
+
+    tokenizer, model = load_model(model_id, device, settings.hf_dtype, settings.hf_quant)
+    params = resolve_generation_params(max_new_tokens, temperature, top_k, top_p)
 
     text_gen = pipeline(
         "text-generation",
         model=model,
         tokenizer=tokenizer,
-        device=device,
-        max_new_tokens=max_new_tokens or settings.max_new_tokens,
+        # models dispatched by accelerate are already placed; the pipeline must not move them
+        device=device if getattr(model, "hf_device_map", None) is None else None,
         do_sample=True,
-        temperature=temperature if temperature is not None else settings.temperature,
-        top_p=top_p if top_p is not None else settings.top_p,
-        top_k=top_k if top_k is not None else settings.top_k,
+        **params._asdict(),
+        # HuggingFacePipeline returns generated_text as-is, so the prompt must not be echoed
+        return_full_text=False,
+        clean_up_tokenization_spaces=False,
     )
 
     return text_gen
 
 
-def generate(prompt: str, max_new_tokens: Optional[int] = None, temperature: Optional[float] = None, top_k: Optional[float] = None, top_p: Optional[float] = None) -> str:
-    pipe = load_local_hf_pipeline()
-    outputs = pipe(
-        prompt,
-        max_new_tokens=max_new_tokens or settings.max_new_tokens,
-        do_sample=True,
-        temperature=temperature if temperature is not None else settings.temperature,
-        top_p=top_p if top_p is not None else settings.top_p,
-        top_k=top_k if top_k is not None else settings.top_k,
-        pad_token_id=pipe.tokenizer.eos_token_id,
-    )
-    return outputs[0]["generated_text"]
+@lru_cache(maxsize=1)
+def get_default_pipeline() -> TextGenerationPipeline:
+    return load_local_hf_pipeline()
+
+
+def generate(prompt: str, max_new_tokens: Optional[int] = None, temperature: Optional[float] = None, top_k: Optional[int] = None, top_p: Optional[float] = None) -> str:
+    return generate_batch([prompt], max_new_tokens=max_new_tokens, temperature=temperature, top_k=top_k, top_p=top_p)[0]
+
+
+def generate_batch(prompts: List[str], max_new_tokens: Optional[int] = None, temperature: Optional[float] = None, top_k: Optional[int] = None, top_p: Optional[float] = None) -> List[str]:
+    pipe = get_default_pipeline()
+    params = resolve_generation_params(max_new_tokens, temperature, top_k, top_p)
+    with torch.inference_mode():
+        outputs = pipe(
+            prompts,
+            batch_size=max(1, min(len(prompts), settings.hf_batch_size)),
+            do_sample=True,
+            **params._asdict(),
+            pad_token_id=pipe.tokenizer.pad_token_id,
+            use_cache=True,
+        )
+    return [output[0]["generated_text"] for output in outputs]
@@ -1,26 +1,39 @@
+from functools import lru_cache
 from typing import Optional
 
-from pydantic import Field
-from pydantic_settings import BaseSettings
+from pydantic import Field, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     # HuggingFace transformers model
     hf_model_id: str = Field("distilgpt2", env="HF_MODEL_ID")
     hf_device: str = Field("cpu", env="HF_DEVICE")
+    hf_dtype: Optional[str] = Field(None, env="HF_DTYPE")
+    hf_quant: Optional[str] = Field(None, env="HF_QUANT")
+    hf_compile: bool = Field(False, env="HF_COMPILE")
 
     # Generation params
     max_new_tokens: int = Field(256, env="MAX_NEW_TOKENS")
     temperature: float = Field(0.5, env="TEMPERATURE")
     top_p: float = Field(0.95, env="TOP_P")
-    top_k: float = Field(50, env="TOP_K")
+    top_k: int = Field(50, env="TOP_K")
+    hf_batch_size: int = Field(8, env="HF_BATCH_SIZE")
 
     # Runtime
     seed: Optional[int] = Field(None, env="SEED")
 
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
+    @field_validator("hf_device", "hf_dtype", "hf_quant", mode="before")
+    @classmethod
+    def normalize_name(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
 
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", frozen=True)
 
-settings = Settings()
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
+
+
+settings = get_settings()